@@ -47,21 +47,34 @@ class ThermaltakeDevice(ClassifiedObject):
 class ThermaltakeRGBDevice(ThermaltakeDevice):
     num_leds = 0
     index_per_led = 0
+    # last frame sent by set_lighting, resending it would not change anything
+    _last_lighting = None
 
-    def set_lighting(self, values: list = None, mode=0x18, speed=0x00) -> None:
+    def set_lighting(self, values: bytes = None, mode=0x18, speed=0x00) -> None:
         """
         for the sake of performance this will assume the data your passing in is correct.
         if it isnt the worst that will happen (i guess) is the lights wont show up as
         expected.
-        :param values: [r,g,b...]
+        :param values: g, r, b bytes per led (a list of ints also works)
         :param mode: lighting mode(hex)
         :param speed: light update speed(hex)
         """
-        data = [PROTOCOL_SET, PROTOCOL_LIGHT, self.port, mode + speed]
+        try:
+            data = self._lighting_frame(values, mode, speed)
+        except ValueError as e:
+            LOGGER.warning('{} set lighting: {}, ignoring frame'.format(self.__class__.__name__, e))
+            return
+        if data == self._last_lighting:
+            return
+        LOGGER.debug('{} set lighting: raw hex: {}'.format(self.__class__.__name__, data.hex()))
+        self.controller.driver.write_out(data)
+        self._last_lighting = data
+
+    def _lighting_frame(self, values: bytes = None, mode=0x18, speed=0x00) -> bytearray:
+        data = bytearray((PROTOCOL_SET, PROTOCOL_LIGHT, self.port, mode + speed))
         if values:
             data.extend(values)
-        LOGGER.debug('{} set lighting: raw hex: {}'.format(self.__class__.__name__, data))
-        self.controller.driver.write_out(data)
+        return data
 
 
 class ThermaltakeFanDevice(ThermaltakeDevice):
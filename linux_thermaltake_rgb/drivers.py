@@ -17,6 +17,8 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
+from array import array
+from threading import Lock
 
 import usb
 
@@ -29,6 +31,9 @@ class ThermaltakeControllerDriver:
     def __init__(self, *args, **kwargs):
         self.vendor_id = self.VENDOR_ID
         self.product_id = None
+        # fan and lighting threads share the driver, and with it the transfer buffer
+        self._tx_lock = Lock()
+        self._allocate_tx_buffer(64)
         self.init(*args, **kwargs)
 
         self._initialize_device()
@@ -92,35 +97,49 @@ class ThermaltakeControllerDriver:
     def init_controller(self):
         raise NotImplementedError()
 
-    @staticmethod
-    def _generate_data_array(length: int = 64, value: int = 0x00) -> list:
+    def _allocate_tx_buffer(self, length: int) -> None:
         """
-        helper function to generate a zeroed out array of length size
+        reusable transfer buffer so every write does not allocate a new payload.
+        pyusb hands an array('B') straight to the backend, any other type is copied into one first
         """
-        return [value for _ in range(length)]
+        self._tx_buf = array('B', bytes(length))
+        self._tx_view = memoryview(self._tx_buf)
+        # length of the last payload, everything past it is known to be zero
+        self._tx_len = 0
 
-    def _populate_partial_data_array(self, in_array: list, length=64) -> list:
+    def _fill(self, data, length: int = 64) -> array:
         """
-        helper function to fill the rest of the array with 0x00
-        until desired length is attained
+        copy data (a list of ints or any bytes-like object) into the transfer buffer,
+        zeroing only what is left of the previous payload past the end of this one.
+        callers must hold _tx_lock until the buffer has been written, _tx_len is only
+        accurate if no other write touched the buffer in between
         """
-        array = list(in_array)
-        array.extend(
-            self._generate_data_array(length - len(in_array))
-        )
-        return array
-
-    def write_out(self, data: list, length: int = 64) -> None:
-        try:
-            self.endpoint_out.write(self._populate_partial_data_array(data, length))
-        except OverflowError:
-            return
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)
+        n = len(data)
+        # oversized payloads are sent whole, as they always were
+        size = max(length, n)
+        if len(self._tx_buf) != size:
+            self._allocate_tx_buffer(size)
+        self._tx_view[:n] = data
+        if n < self._tx_len:
+            self._tx_view[n:self._tx_len] = bytes(self._tx_len - n)
+        self._tx_len = n
+        return self._tx_buf
+
+    def write_out(self, data: bytes, length: int = 64) -> None:
+        with self._tx_lock:
+            try:
+                self.endpoint_out.write(self._fill(data, length))
+            except (OverflowError, ValueError):
+                return
 
     def read_out(self, length: int = 64) -> bytearray:
         return self.endpoint_out.read(length)
 
-    def write_in(self, data: list, length: int = 64) -> None:
-        self.endpoint_in.write(self._populate_partial_data_array(data, length))
+    def write_in(self, data: bytes, length: int = 64) -> None:
+        with self._tx_lock:
+            self.endpoint_in.write(self._fill(data, length))
 
     def read_in(self, length: int = 64) -> bytearray:
         return self.endpoint_in.read(length)
@@ -17,9 +17,13 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
+import heapq
 import time
+from bisect import bisect_right
 from collections import namedtuple
-from threading import Thread
+from functools import lru_cache
+from itertools import count
+from threading import Condition, Lock, Thread, current_thread
 
 from psutil import sensors_temperatures
 
@@ -28,9 +32,12 @@ from linux_thermaltake_rgb.classified_object import ClassifiedObject
 from linux_thermaltake_rgb.globals import RGB
 import math
 
-import datetime
 from dateutil.parser import parse
 
+# per hue sector, which of (v, t, p, q) feeds r, g and b
+_HSV_SECTORS = ((0, 1, 2), (3, 0, 2), (2, 0, 1), (2, 3, 0), (1, 2, 0), (0, 2, 3))
+
+
 def compass_to_rgb(h, s=1, v=1):
     h = float(h)
     s = float(s)
@@ -44,42 +51,142 @@ def compass_to_rgb(h, s=1, v=1):
     q = v * (1 - f * s)
     t = v * (1 - (1 - f) * s)
 
-    r, g, b = 0, 0, 0
-    if hi == 0:
-        r, g, b = v, t, p
-    elif hi == 1:
-        r, g, b = q, v, p
-    elif hi == 2:
-        r, g, b = p, v, t
-    elif hi == 3:
-        r, g, b = p, q, v
-    elif hi == 4:
-        r, g, b = t, p, v
-    elif hi == 5:
-        r, g, b = v, p, q
+    vals = (v, t, p, q)
+    r_i, g_i, b_i = _HSV_SECTORS[hi]
+    r, g, b = vals[r_i], vals[g_i], vals[b_i]
 
     r, g, b = int(r * 255), int(g * 255), int(b * 255)
     return g, r, b
 
 
+# g, r, b bytes for every whole compass angle, 3 bytes per degree
+_GRB_TABLE = bytes(c for angle in range(361) for c in compass_to_rgb(angle))
+
+
+def compass_to_grb_bytes(angle) -> bytes:
+    """
+    table lookup of compass_to_rgb for the nearest whole angle in [0, 360]
+    """
+    i = round(angle) * 3
+    return _GRB_TABLE[i:i + 3]
+
+
+_sensor_lock = Lock()
+_sensor_cache = {'time': None, 'temperatures': None}
+
+
+def _cached_sensors_temperatures(ttl: float = 0.5) -> dict:
+    """
+    sensors_temperatures() shared between every effect that asks within ttl seconds
+    """
+    with _sensor_lock:
+        now = time.monotonic()
+        if _sensor_cache['time'] is None or now - _sensor_cache['time'] > ttl:
+            _sensor_cache['temperatures'] = sensors_temperatures()
+            _sensor_cache['time'] = now
+        return _sensor_cache['temperatures']
+
+
+class _Scheduler:
+    """
+    runs next() of every started threaded effect from a single shared thread,
+    the thread exits once the last effect is stopped
+    """
+    def __init__(self):
+        self._cond = Condition()
+        self._effects = {}
+        self._queue = []
+        self._seq = count()
+        self._thread = None
+        # effect whose next() is in progress on the scheduler thread
+        self._running = None
+
+    def register(self, effect, interval):
+        with self._cond:
+            if effect in self._effects:
+                return
+            self._effects[effect] = interval
+            heapq.heappush(self._queue, (time.monotonic(), next(self._seq), effect))
+            if self._thread is None:
+                self._thread = Thread(target=self._main_loop)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def unregister(self, effect):
+        with self._cond:
+            if effect not in self._effects:
+                return
+            del self._effects[effect]
+            self._queue = [entry for entry in self._queue if entry[2] is not effect]
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+            # wait for a tick of this effect that may already be running,
+            # unless the effect is stopping itself from inside next()
+            if current_thread() is not self._thread:
+                while self._running is effect:
+                    self._cond.wait()
+
+    def _main_loop(self):
+        while True:
+            with self._cond:
+                if not self._effects:
+                    self._thread = None
+                    return
+                deadline, _, effect = self._queue[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                self._running = effect
+            failed = False
+            try:
+                effect.next()
+            except Exception:
+                LOGGER.exception(f'{effect.__class__.__name__} failed, stopping it')
+                failed = True
+            with self._cond:
+                self._running = None
+                if failed:
+                    self._effects.pop(effect, None)
+                elif effect in self._effects:
+                    # pace from the deadline so the time spent in next() does not add up as drift,
+                    # but skip ticks that were missed under load instead of bursting to catch up
+                    deadline = max(deadline + self._effects[effect], time.monotonic())
+                    heapq.heappush(self._queue, (deadline, next(self._seq), effect))
+                self._cond.notify_all()
+
+
+_scheduler = _Scheduler()
+
+
 class LightingEffect(ClassifiedObject):
     model = None
 
     def __init__(self, config):
         self._config = config
         self._devices = []
+        # per device constants, parallel to self._devices
+        self._by_led = []
+        self._num_leds = []
         LOGGER.info(f'initializing {self.__class__.__name__} light controller')
 
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _subclass_dict(cls) -> dict:
+        return {clazz.model: clazz for clazz in cls.inheritors() if clazz.model}
+
     @classmethod
     def factory(cls, config: dict):
-        subclass_dict = {clazz.model: clazz for clazz in cls.inheritors()}
         try:
-            return subclass_dict.get(config.pop('model').lower())(config)
+            return cls._subclass_dict().get(config.pop('model').lower())(config)
         except KeyError as e:
             LOGGER.warn('%s not found in config item', e)
 
     def attach_device(self, device):
         self._devices.append(device)
+        self._by_led.append(device.controller.driver.BY_LED)
+        self._num_leds.append(device.num_leds)
 
     def start(self):
         raise NotImplementedError
@@ -104,31 +211,31 @@ class CustomLightingEffect(LightingEffect):
 
 
 class ThreadedCustomLightingEffect(CustomLightingEffect):
-    def __init__(self, config):
-        super().__init__(config)
-        self._continue = False
-        self._thread = Thread(target=self._main_loop)
-
     def start(self):
-        self._continue = True
-        self._thread.start()
+        self.begin_all()
+        _scheduler.register(self, self._speed)
 
     def stop(self):
-        self._continue = False
-        self._thread.join()
+        _scheduler.unregister(self)
 
     def begin_all(self):
         pass
 
-    def _main_loop(self):
-        self.begin_all()
-        while self._continue:
-            self.next()
-            time.sleep(self._speed)
-
     def next(self):
         raise NotImplementedError
 
+    def _set_all_leds(self, triple: bytes):
+        """
+        light every led of every attached device with the same g, r, b triple,
+        building the payload once per distinct led count
+        """
+        payloads = {}
+        for dev, by_led, num_leds in zip(self._devices, self._by_led, self._num_leds):
+            values = payloads.get(num_leds)
+            if values is None:
+                values = payloads[num_leds] = triple * num_leds
+            dev.set_lighting(mode=by_led, values=values)
+
 
 class AlternatingLightingEffect(CustomLightingEffect):
     """
@@ -143,14 +250,12 @@ class AlternatingLightingEffect(CustomLightingEffect):
         self.even_rgb = self.RGBMap(**self._config.get('even_rgb'))
 
     def start(self):
-        for dev in self._devices:
-            values = []
-            for i in range(dev.num_leds):
-                if i % 2 == 0:
-                    values.extend(self.even_rgb)
-                else:
-                    values.extend(self.odd_rgb)
-            dev.set_lighting(mode=dev.controller.driver.BY_LED, values=values)
+        even = bytes(self.even_rgb)
+        period = even + bytes(self.odd_rgb)
+        for dev, by_led, num_leds in zip(self._devices, self._by_led, self._num_leds):
+            pairs, remainder = divmod(num_leds, 2)
+            values = period * pairs + even * remainder
+            dev.set_lighting(mode=by_led, values=values)
 
     def __str__(self) -> str:
         return f'alternating lighting {self.odd_rgb} {self.even_rgb}'
@@ -174,12 +279,15 @@ class TemperatureLightingEffect(ThreadedCustomLightingEffect):
         self.hot = int(self._config.get('hot', 60))
         self.cur_temp = 0
         self.angle = 0
+        self._last_angle = None
 
-    def next(self):
-        def flatten(l):
-            return [item for sublist in l for item in sublist]
+    def attach_device(self, device):
+        super().attach_device(device)
+        # make sure the new device gets lit on the next tick
+        self._last_angle = None
 
-        self.cur_temp = sensors_temperatures().get(self.sensor_name)[0].current
+    def next(self):
+        self.cur_temp = _cached_sensors_temperatures().get(self.sensor_name)[0].current
         if self.cur_temp <= self.cold:
             self.angle = self.cold_angle
         elif self.cur_temp < self.target:
@@ -194,9 +302,11 @@ class TemperatureLightingEffect(ThreadedCustomLightingEffect):
             self.angle = 120 - ((self.target_angle - self.hot_angle)
                                 / (self.hot - self.target)
                                 * (self.cur_temp - self.target))
-        for dev in self._devices:
-            values = flatten([compass_to_rgb(self.angle)] * dev.num_leds)
-            dev.set_lighting(mode=dev.controller.driver.BY_LED, values=values)
+        angle = round(self.angle)
+        if angle == self._last_angle:
+            return
+        self._last_angle = angle
+        self._set_all_leds(compass_to_grb_bytes(angle))
 
     def __str__(self) -> str:
         return f'temperature lighting'
@@ -220,10 +330,7 @@ class Temperature2LightingEffect(ThreadedCustomLightingEffect):
         self.cur_temp = 0
 
     def next(self):
-        def flatten(l):
-            return [item for sublist in l for item in sublist]
-
-        self.cur_temp = sensors_temperatures().get(self.sensor_name)[0].current
+        self.cur_temp = _cached_sensors_temperatures().get(self.sensor_name)[0].current
         if self.cur_temp < self.cold:
             self.cur_temp = self.cold
         elif self.cur_temp > self.hot:
@@ -233,9 +340,7 @@ class Temperature2LightingEffect(ThreadedCustomLightingEffect):
         for i, c in enumerate(self.cur_rgb):
             self.cur_rgb[i] = self.cold_rgb[i] + round(factor * (self.hot_rgb[i] - self.cold_rgb[i]))
 
-        for dev in self._devices:
-            values = self.cur_rgb * dev.num_leds
-            dev.set_lighting(mode=dev.controller.driver.BY_LED, values=values)
+        self._set_all_leds(bytes(self.cur_rgb))
 
     def __str__(self) -> str:
         return f'temperature2 lighting'
@@ -246,49 +351,33 @@ class ClockLightingEffect(ThreadedCustomLightingEffect):
     ::: settings: [[timestamp, r, g, b], [timestamp, r, g, b], ...]
     """
     model = 'clock'
+    ONE_DAY = 24 * 60 * 60
 
     def __init__(self, config):
         super().__init__(config)
-        self.timestamps = config.get('timestamps')
-        for i, timestamp in enumerate(self.timestamps):
-            self.timestamps[i][0] = parse(timestamp[0])
-        self.cur_rgb = [0, 0, 0]
+        keypoints = sorted((self._seconds_of_day(parse(timestamp)), rgb)
+                           for timestamp, *rgb in config.get('timestamps'))
+        self._secs = [secs for secs, _ in keypoints]
+        self._grbs = [(g, r, b) for _, (r, g, b) in keypoints]
+
+    @staticmethod
+    def _seconds_of_day(t) -> int:
+        return t.hour * 3600 + t.minute * 60 + t.second
 
     def next(self):
-        now = datetime.datetime.now()
-        one_day = datetime.timedelta(days=1)
-        before = None
-        after  = None
-
-        for i, timestamp in enumerate(self.timestamps):
-            time = timestamp[0]
-            if (now > time):
-                # today
-                timedelta = now - time
-                if not before or before[1] > timedelta:
-                    before = (i, timedelta)
-                # tomorrow
-                timedelta = (time + one_day) - now
-                if not after or after[1] > timedelta:
-                    after = (i, timedelta)
-            else:
-                # today
-                timedelta = time - now
-                if not after or after[1] > timedelta:
-                    after = (i, timedelta)
-                # yesterday
-                timedelta = now - (time - one_day)
-                if not before or before[1] > timedelta:
-                    before = (i, timedelta)
-
-        factor = before[1] / (before[1] + after[1])
-        for i in range(0, 2):
-            self.cur_rgb[i] = round(self.timestamps[before[0]][i+1] + (self.timestamps[after[0]][i+1] - self.timestamps[before[0]][i+1]) * factor)
-        cur_grb = [self.cur_rgb[1], self.cur_rgb[0], self.cur_rgb[2]]
-
-        for dev in self._devices:
-            values = cur_grb * dev.num_leds
-            dev.set_lighting(mode=dev.controller.driver.BY_LED, values=values)
+        now = time.localtime()
+        self._set_all_leds(self._grb_at(now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec))
+
+    def _grb_at(self, now: int) -> bytes:
+        """
+        colour for a given second of the day, faded between the keypoints either side of it
+        """
+        after = bisect_right(self._secs, now) % len(self._secs)
+        before = after - 1
+        elapsed = (now - self._secs[before]) % self.ONE_DAY
+        span = (self._secs[after] - self._secs[before]) % self.ONE_DAY or self.ONE_DAY
+        factor = elapsed / span
+        return bytes(round(lo + (hi - lo) * factor) for lo, hi in zip(self._grbs[before], self._grbs[after]))
 
     def __str__(self) -> str:
         return f'clock lighting'
@@ -303,6 +392,18 @@ class ThermaltakeLightingEffect(LightingEffect):
     def start(self):
         raise NotImplementedError
 
+    def _solid_payload(self, count: int = 12) -> bytes:
+        """
+        the configured colour repeated for count leds, empty if it is missing or out of range
+        """
+        try:
+            return bytes((self._config['g'], self._config['r'], self._config['b'])) * count
+        except KeyError as e:
+            LOGGER.warn('%s not found in config item: lighting_controller', e)
+        except ValueError as e:
+            LOGGER.warn('invalid colour in config item: lighting_controller: %s', e)
+        return b''
+
 
 class FullLightingEffect(ThermaltakeLightingEffect):
     """
@@ -311,14 +412,7 @@ class FullLightingEffect(ThermaltakeLightingEffect):
     model = 'full'
 
     def start(self):
-        values = []
-        try:
-            g, r, b = self._config['g'], self._config['r'], self._config['b']
-            for i in range(12):
-                values.extend([g, r, b])
-        except KeyError as e:
-            LOGGER.warn('%s not found in config item: lighting_controller', e)
-
+        values = self._solid_payload()
         for device in self._devices:
             device.set_lighting(mode=RGB.Mode.FULL, speed=0x00, values=values)
 
@@ -337,7 +431,7 @@ class OffLightingEffect(ThermaltakeLightingEffect):
 
     def start(self):
         for device in self._devices:
-            device.set_lighting(mode=RGB.Mode.FULL, speed=0x00, values=[0] * 3 * 12)
+            device.set_lighting(mode=RGB.Mode.FULL, speed=0x00, values=bytes(3 * 12))
 
 
 class PerLEDLightingEffect(ThermaltakeLightingEffect):
@@ -346,16 +440,9 @@ class PerLEDLightingEffect(ThermaltakeLightingEffect):
     model = 'perled'
 
     def start(self):
-        values = []
-        try:
-            g, r, b = self._config['g'], self._config['r'], self._config['b']
-            for i in range(12):
-                values.extend([g, r, b])
-        except KeyError as e:
-            LOGGER.warn('%s not found in config item: lighting_controller', e)
-
-        for device in self._devices:
-            device.set_lighting(mode=device.controller.driver.BY_LED, speed=0x00, values=values)
+        values = self._solid_payload()
+        for device, by_led in zip(self._devices, self._by_led):
+            device.set_lighting(mode=by_led, speed=0x00, values=values)
 
 
 class FlowLightingEffect(ThermaltakeLightingEffect):
@@ -406,16 +493,11 @@ class BlinkLightingEffect(ThermaltakeLightingEffect):
     model = 'blink'
 
     def start(self):
-        try:
-            g, r, b = self._config['g'], self._config['r'], self._config['b']
-        except KeyError as e:
-            LOGGER.warn('%s not found in config item: lighting_controller', e)
+        values = self._solid_payload()
+        if not values:
             return
 
         for device in self._devices:
-            values = []
-            for i in range(12):
-                values.extend([g, r, b])
             device.set_lighting(mode=RGB.Mode.BLINK, speed=self._speed, values=values)
 
 
@@ -428,16 +510,11 @@ class PulseLightingEffect(ThermaltakeLightingEffect):
     model = 'pulse'
 
     def start(self):
-        try:
-            g, r, b = self._config['g'], self._config['r'], self._config['b']
-        except KeyError as e:
-            LOGGER.warn('%s not found in config item: lighting_controller', e)
+        values = self._solid_payload()
+        if not values:
             return
 
         for device in self._devices:
-            values = []
-            for i in range(12):
-                values.extend([g, r, b])
             device.set_lighting(mode=RGB.Mode.PULSE, speed=self._speed, values=values)
 
 
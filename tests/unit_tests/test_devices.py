@@ -19,10 +19,10 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
 import unittest
 
-from mock import patch
+from mock import patch, Mock
 
 from linux_thermaltake_rgb.controllers import ThermaltakeController
-from linux_thermaltake_rgb.devices import ThermaltakeDevice
+from linux_thermaltake_rgb.devices import ThermaltakeDevice, ThermaltakeRGBDevice
 
 
 class DeviceTest(unittest.TestCase):
@@ -38,3 +38,24 @@ class DeviceTest(unittest.TestCase):
             controller.attach_device(i, dev)
             self.assertIsInstance(ThermaltakeDevice.factory(clazz.model, controller, 1), clazz)
             self.assertTrue(init_dev.called)
+
+    def test_set_lighting_skips_repeated_frames(self):
+        controller = Mock()
+        dev = ThermaltakeDevice.factory('Riing Plus', controller, 1)
+        self.assertIsInstance(dev, ThermaltakeRGBDevice)
+
+        dev.set_lighting(mode=0x18, values=bytes([1, 2, 3]) * 12)
+        dev.set_lighting(mode=0x18, values=bytes([1, 2, 3]) * 12)
+        self.assertEqual(controller.driver.write_out.call_count, 1)
+
+        dev.set_lighting(mode=0x18, values=bytes([3, 2, 1]) * 12)
+        self.assertEqual(controller.driver.write_out.call_count, 2)
+
+    def test_set_lighting_ignores_out_of_range_values(self):
+        controller = Mock()
+        dev = ThermaltakeDevice.factory('Riing Plus', controller, 1)
+        dev.set_lighting(mode=0x08, values=[0, 300, 0])
+        self.assertFalse(controller.driver.write_out.called)
+
+        dev.set_lighting(mode=0x08, values=[0, 255, 0])
+        self.assertTrue(controller.driver.write_out.called)
@@ -0,0 +1,95 @@
+"""
+linux_thermaltake_rgb
+Software to control your thermaltake hardware
+Copyright (C) 2018  Max Chesterfield (chestm007@hotmail.com)
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+import time
+import unittest
+from threading import Thread, current_thread
+
+from mock import patch, Mock
+
+from linux_thermaltake_rgb.drivers import ThermaltakeG3ControllerDriver
+
+
+class DriverTest(unittest.TestCase):
+
+    @patch('linux_thermaltake_rgb.drivers.ThermaltakeControllerDriver._initialize_device', autospec=True)
+    def setUp(self, init_dev):
+        self.driver = ThermaltakeG3ControllerDriver(1)
+        self.driver.endpoint_out = Mock()
+
+    def written(self):
+        return bytes(self.driver.endpoint_out.write.call_args[0][0])
+
+    def test_write_out_pads_to_length(self):
+        self.driver.write_out([0x32, 0x51, 0x01, 0x01, 50])
+        self.assertEqual(self.written(), bytes([0x32, 0x51, 0x01, 0x01, 50]) + bytes(59))
+
+    def test_write_out_clears_previous_payload(self):
+        self.driver.write_out([0xff] * 40)
+        self.driver.write_out([0x32, 0x53])
+        self.assertEqual(self.written(), bytes([0x32, 0x53]) + bytes(62))
+
+    def test_write_out_sends_oversized_payload_whole(self):
+        self.driver.write_out(list(range(70)))
+        self.assertEqual(self.written(), bytes(range(70)))
+        self.driver.write_out([0x32, 0x53])
+        self.assertEqual(self.written(), bytes([0x32, 0x53]) + bytes(62))
+
+    def test_write_out_ignores_out_of_range_values(self):
+        self.driver.write_out([0x32, 0x52, 0x01, 0x18, 256])
+        self.assertFalse(self.driver.endpoint_out.write.called)
+
+    def test_write_out_accepts_bytes(self):
+        self.driver.write_out(bytearray([0x32, 0x52, 0x01, 0x19]) + bytes([1, 2, 3]))
+        self.assertEqual(self.written(), bytes([0x32, 0x52, 0x01, 0x19, 1, 2, 3]) + bytes(57))
+
+    def test_concurrent_writers_do_not_share_frames(self):
+        frames = {}
+
+        def write(buf):
+            time.sleep(0)  # let the other writer run while the transfer is in flight
+            frames.setdefault(current_thread().name, set()).add(bytes(buf))
+        self.driver.endpoint_out.write.side_effect = write
+
+        def writer(frame):
+            for _ in range(500):
+                self.driver.write_out(frame)
+
+        fan_frame = [0x32, 0x51, 0x01, 0x01, 50]
+        light_frame = [0x32, 0x52, 0x01, 0x18] + [0xff] * 36
+        threads = [Thread(target=writer, args=(fan_frame,), name='fan'),
+                   Thread(target=writer, args=(light_frame,), name='lights')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(frames, {'fan': {bytes(fan_frame) + bytes(59)},
+                                  'lights': {bytes(light_frame) + bytes(24)}})
+
+    def test_write_out_waits_for_buffer_lock(self):
+        self.driver.write_out([0xff] * 40)
+        with self.driver._tx_lock:
+            thread = Thread(target=self.driver.write_out, args=([0x32, 0x53],))
+            thread.start()
+            thread.join(0.05)
+            self.assertTrue(thread.is_alive())
+            self.assertEqual(self.driver._tx_len, 40)
+        thread.join()
+        self.assertEqual(self.driver._tx_len, 2)
+        self.assertEqual(self.written(), bytes([0x32, 0x53]) + bytes(62))
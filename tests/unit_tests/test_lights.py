@@ -18,16 +18,56 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
 import unittest
+from collections import namedtuple
+from threading import Event, Thread, current_thread, get_ident
 
-from linux_thermaltake_rgb.lighting_manager import LightingEffect
+from mock import Mock, patch
+
+from linux_thermaltake_rgb import lighting_manager
+from linux_thermaltake_rgb.lighting_manager import LightingEffect, ThreadedCustomLightingEffect, compass_to_rgb, \
+    compass_to_grb_bytes
+
+
+Temp = namedtuple('Temp', ['current'])
+
+
+def mock_device(num_leds=12):
+    dev = Mock()
+    dev.num_leds = num_leds
+    dev.controller.driver.BY_LED = 0x18
+    return dev
+
+
+class BlockingEffect(ThreadedCustomLightingEffect):
+    """
+    test effect whose next() waits until released, stopping itself afterwards if asked to
+    """
+    def __init__(self, stop_self=False):
+        super().__init__({'speed': 'extreme'})
+        self.stop_self = stop_self
+        self.entered = Event()
+        self.release = Event()
+        self.thread = None
+
+    def next(self):
+        self.thread = current_thread()
+        self.entered.set()
+        self.release.wait(1)
+        if self.stop_self:
+            self.stop()
 
 
 class LightTest(unittest.TestCase):
+    def setUp(self):
+        lighting_manager._sensor_cache['time'] = None
 
     def test_light_factory(self):
         config = {
             'odd_rgb': dict(r=4, g=4, b=4),
-            'even_rgb': dict(r=4, g=4, b=4)
+            'even_rgb': dict(r=4, g=4, b=4),
+            'cold_rgb': dict(r=0, g=0, b=255),
+            'hot_rgb': dict(r=255, g=0, b=0),
+            'timestamps': [['08:00', 0, 0, 0]],
         }
         for clazz in LightingEffect.inheritors():
             if clazz.model is None:
@@ -36,3 +76,171 @@ class LightTest(unittest.TestCase):
 
             effect = LightingEffect.factory(config)
             self.assertIsInstance(effect, LightingEffect)
+
+    def test_compass_table_matches_compass_to_rgb(self):
+        for angle in range(361):
+            self.assertEqual(compass_to_grb_bytes(angle), bytes(compass_to_rgb(angle)))
+
+    @patch('linux_thermaltake_rgb.lighting_manager.sensors_temperatures')
+    def test_temperature_effect_sets_every_led(self, sensors):
+        sensors.return_value = {'k10temp': [Temp(current=80)]}
+        effect = LightingEffect.factory({'model': 'temperature', 'sensor_name': 'k10temp'})
+        dev = mock_device()
+        effect.attach_device(dev)
+        effect.next()
+        dev.set_lighting.assert_called_once_with(mode=0x18, values=bytes(compass_to_rgb(0)) * 12)
+
+    def test_alternating_effect_payload(self):
+        effect = LightingEffect.factory({'model': 'alternating',
+                                         'odd_rgb': dict(r=1, g=2, b=3),
+                                         'even_rgb': dict(r=4, g=5, b=6)})
+        dev = mock_device(num_leds=3)
+        effect.attach_device(dev)
+        effect.start()
+        dev.set_lighting.assert_called_once_with(mode=0x18, values=bytes([5, 4, 6, 2, 1, 3, 5, 4, 6]))
+
+    @patch('linux_thermaltake_rgb.lighting_manager.sensors_temperatures')
+    def test_temperature_effect_shares_payload_between_devices(self, sensors):
+        sensors.return_value = {'k10temp': [Temp(current=20)]}
+        effect = LightingEffect.factory({'model': 'temperature', 'sensor_name': 'k10temp'})
+        devs = [mock_device(), mock_device(), mock_device(num_leds=6)]
+        for dev in devs:
+            effect.attach_device(dev)
+        effect.next()
+        payloads = [dev.set_lighting.call_args[1]['values'] for dev in devs]
+        self.assertIs(payloads[0], payloads[1])
+        self.assertEqual(payloads[2], bytes(compass_to_rgb(240)) * 6)
+
+    def test_clock_effect_fades_across_midnight(self):
+        effect = LightingEffect.factory({'model': 'clock',
+                                         'timestamps': [['12:00', 0, 0, 0],
+                                                        ['22:00', 200, 0, 0],
+                                                        ['02:00', 0, 100, 0]]})
+        midnight = 0
+        self.assertEqual(effect._grb_at(midnight), bytes([50, 100, 0]))
+        self.assertEqual(effect._grb_at(22 * 3600), bytes([0, 200, 0]))
+        self.assertEqual(effect._grb_at(7 * 3600), bytes([50, 0, 0]))
+
+    def test_clock_effect_fades_every_channel(self):
+        effect = LightingEffect.factory({'model': 'clock',
+                                         'timestamps': [['06:00', 0, 0, 0],
+                                                        ['18:00', 100, 150, 200]]})
+        self.assertEqual(effect._grb_at(9 * 3600), bytes([38, 25, 50]))
+
+    @patch('linux_thermaltake_rgb.lighting_manager.sensors_temperatures')
+    def test_threaded_effects_share_scheduler(self, sensors):
+        sensors.return_value = {'k10temp': [Temp(current=40)]}
+        effects, ticked, threads = [], [], set()
+
+        def tick(event):
+            threads.add(get_ident())
+            event.set()
+
+        for _ in range(2):
+            effect = LightingEffect.factory({'model': 'temperature', 'sensor_name': 'k10temp', 'speed': 'extreme'})
+            dev = mock_device()
+            event = Event()
+            dev.set_lighting.side_effect = lambda *args, event=event, **kwargs: tick(event)
+            effect.attach_device(dev)
+            effects.append(effect)
+            ticked.append(event)
+
+        for effect in effects:
+            effect.start()
+        scheduler_thread = lighting_manager._scheduler._thread
+        try:
+            for event in ticked:
+                self.assertTrue(event.wait(1))
+        finally:
+            for effect in effects:
+                effect.stop()
+
+        # both effects ticked on the one scheduler thread, not on the caller's or their own
+        self.assertEqual(threads, {scheduler_thread.ident})
+        self.assertNotEqual(scheduler_thread.ident, get_ident())
+
+        for event in ticked:
+            event.clear()
+        self.assertFalse(any(event.wait(0.05) for event in ticked))
+
+        # the scheduler thread exits once the last effect is stopped
+        scheduler_thread.join(1)
+        self.assertFalse(scheduler_thread.is_alive())
+        self.assertIsNone(lighting_manager._scheduler._thread)
+
+    @patch('linux_thermaltake_rgb.lighting_manager.sensors_temperatures')
+    def test_temperature_effects_share_sensor_reads(self, sensors):
+        sensors.return_value = {'k10temp': [Temp(current=40)]}
+        for model in ('temperature', 'temperature2'):
+            effect = LightingEffect.factory({'model': model, 'sensor_name': 'k10temp',
+                                             'cold_rgb': dict(r=0, g=0, b=255),
+                                             'hot_rgb': dict(r=255, g=0, b=0)})
+            effect.next()
+        self.assertEqual(sensors.call_count, 1)
+
+    @patch('linux_thermaltake_rgb.lighting_manager.sensors_temperatures')
+    def test_temperature_effect_skips_unchanged_angle(self, sensors):
+        sensors.return_value = {'k10temp': [Temp(current=45)]}
+        effect = LightingEffect.factory({'model': 'temperature', 'sensor_name': 'k10temp'})
+        dev = mock_device()
+        effect.attach_device(dev)
+        effect.next()
+        effect.next()
+        self.assertEqual(dev.set_lighting.call_count, 1)
+
+        other = mock_device()
+        effect.attach_device(other)
+        effect.next()
+        self.assertEqual(dev.set_lighting.call_count, 2)
+        self.assertEqual(other.set_lighting.call_count, 1)
+
+    def test_solid_effects_payload(self):
+        for model in ('full', 'perled', 'blink', 'pulse'):
+            effect = LightingEffect.factory({'model': model, 'r': 1, 'g': 2, 'b': 3})
+            dev = mock_device()
+            effect.attach_device(dev)
+            effect.start()
+            self.assertEqual(dev.set_lighting.call_args[1]['values'], bytes([2, 1, 3]) * 12)
+
+    def test_blink_without_colour_does_nothing(self):
+        for config in ({'r': 1}, {'r': 300, 'g': 0, 'b': 0}):
+            effect = LightingEffect.factory(dict(config, model='blink'))
+            dev = mock_device()
+            effect.attach_device(dev)
+            effect.start()
+            self.assertFalse(dev.set_lighting.called)
+
+    @patch('linux_thermaltake_rgb.lighting_manager.time.localtime')
+    def test_clock_effect_uses_local_time(self, localtime):
+        localtime.return_value = Mock(tm_hour=9, tm_min=0, tm_sec=0)
+        effect = LightingEffect.factory({'model': 'clock',
+                                         'timestamps': [['06:00', 0, 0, 0],
+                                                        ['18:00', 100, 150, 200]]})
+        dev = mock_device()
+        effect.attach_device(dev)
+        effect.next()
+        dev.set_lighting.assert_called_once_with(mode=0x18, values=bytes([38, 25, 50]) * 12)
+
+    def test_effect_can_stop_itself(self):
+        effect = BlockingEffect(stop_self=True)
+        effect.release.set()
+        effect.start()
+        self.assertTrue(effect.entered.wait(1))
+        effect.thread.join(1)
+        self.assertFalse(effect.thread.is_alive())
+        self.assertIsNone(lighting_manager._scheduler._thread)
+
+    def test_stop_does_not_wait_for_other_effects(self):
+        slow, idle = BlockingEffect(), BlockingEffect()
+        idle.release.set()
+        slow.start()
+        self.assertTrue(slow.entered.wait(1))
+        idle.start()
+        try:
+            stopper = Thread(target=idle.stop)
+            stopper.start()
+            stopper.join(0.5)
+            self.assertFalse(stopper.is_alive())
+        finally:
+            slow.release.set()
+            slow.stop()